@@ -16,4 +16,5 @@ class ProductAdmin(admin.ModelAdmin):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "customer", "total_amount", "order_date", "created_at")
     search_fields = ("customer__name", "customer__email")
+    list_select_related = ("customer",)
     filter_horizontal = ("products",)
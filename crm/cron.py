@@ -1,7 +1,7 @@
-import os
-from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import time
+
+LOW_STOCK_LOG = "/tmp/low_stock_updates_log.txt"
+
 
 # -------------------------
 # Log CRM heartbeat
@@ -13,7 +13,7 @@ def log_crm_heartbeat():
     to /tmp/crm_heartbeat_log.txt
     """
     log_path = "/tmp/crm_heartbeat_log.txt"
-    timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
+    timestamp = time.strftime("%d/%m/%Y-%H:%M:%S")
     message = f"{timestamp} CRM is alive\n"
 
     with open(log_path, "a") as log_file:
@@ -21,55 +21,14 @@ def log_crm_heartbeat():
 
 
 # -------------------------
-# Update low-stock products using GraphQL mutation
+# Log low-stock restocks (run by crm.tasks.update_low_stock)
 # -------------------------
-def update_low_stock():
+def log_low_stock_update(timestamp, message, products=()):
     """
-    Executes the UpdateLowStockProducts GraphQL mutation and logs updates
-    to /tmp/low_stock_updates_log.txt
+    Appends one entry to /tmp/low_stock_updates_log.txt, with a line per
+    (name, stock) pair in products, using a single write.
     """
-    log_path = "/tmp/low_stock_updates_log.txt"
-    timestamp = datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
-
-    # Configure transport and client
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql",
-        verify=False,
-        retries=3,
-    )
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-
-    # GraphQL mutation
-    query = gql(
-        """
-        mutation {
-          updateLowStockProducts {
-            success
-            message
-            updatedProducts {
-              id
-              name
-              stock
-            }
-          }
-        }
-        """
-    )
-
-    try:
-        result = client.execute(query)
-        data = result.get("updateLowStockProducts", {})
-        message = data.get("message", "No response message.")
-        updated_products = data.get("updatedProducts", [])
-
-        with open(log_path, "a") as log_file:
-            log_file.write(f"\n{timestamp} - {message}\n")
-            for p in updated_products:
-                log_file.write(f"Product: {p['name']}, New stock: {p['stock']}\n")
-
-        print(f"[{timestamp}] Low stock update complete.")
-
-    except Exception as e:
-        with open(log_path, "a") as log_file:
-            log_file.write(f"\n{timestamp} - Error: {e}\n")
-        print(f"[{timestamp}] Low stock update failed: {e}")
+    lines = [f"\n{timestamp} - {message}\n"]
+    lines.extend(f"Product: {name}, New stock: {stock}\n" for name, stock in products)
+    with open(LOW_STOCK_LOG, "a") as log_file:
+        log_file.write("".join(lines))
@@ -1,52 +1,64 @@
 #!/usr/bin/env python3
 import datetime
-from gql import gql, Client
+import time
+from gql import gql, Client, GraphQLRequest
 from gql.transport.requests import RequestsHTTPTransport
 
 LOG_FILE = "/tmp/order_reminders_log.txt"
+GRAPHQL_ENDPOINT = "http://localhost:8000/graphql/"
+
+# Parsed once; the cutoff date is passed as a variable on each run
+RECENT_ORDERS_QUERY = gql("""
+query RecentOrders($since: Date!) {
+    allOrders(orderDate_Gte: $since) {
+        edges {
+            node {
+                id
+                customer {
+                    email
+                }
+            }
+        }
+    }
+}
+""")
 
 def main():
-    # Define the GraphQL endpoint
+    since = datetime.date.today() - datetime.timedelta(days=7)
+    query = GraphQLRequest(RECENT_ORDERS_QUERY, variable_values={"since": since.isoformat()})
+
     transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql",
+        url=GRAPHQL_ENDPOINT,
         verify=True,
         retries=3,
+        timeout=10,
     )
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-
-    # Define the query
-    query = gql("""
-    query RecentOrders {
-        orders(orderDate_Gte: "%s") {
-            id
-            customer {
-                email
-            }
-        }
-    }
-    """ % (datetime.date.today() - datetime.timedelta(days=7)))
+    client = Client(transport=transport)
 
     # Execute query
     try:
         result = client.execute(query)
-        orders = result.get("orders", [])
+        orders = [edge["node"] for edge in result["allOrders"]["edges"]]
     except Exception as e:
         orders = []
         log_message(f"Error querying GraphQL: {e}")
 
     # Log results
     if orders:
-        for order in orders:
-            log_message(f"Order ID: {order['id']}, Customer Email: {order['customer']['email']}")
+        log_message(*(
+            f"Order ID: {order['id']}, Customer Email: {order['customer']['email']}"
+            for order in orders
+        ))
     else:
         log_message("No orders found in the last 7 days.")
 
     print("Order reminders processed!")
 
-def log_message(message):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def log_message(*messages):
+    """Append one timestamped line per message to the log in a single write."""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     with open(LOG_FILE, "a") as log_file:
-        log_file.write(f"[{timestamp}] {message}\n")
+        log_file.write("".join(f"[{timestamp}] {message}\n" for message in messages))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,23 @@
+from gql import Client
+from gql.transport.requests import RequestsHTTPTransport
+
+_sessions = {}
+
+
+def get_gql_session(url, verify=True):
+    """
+    Returns a connected gql session for url, created on first use and kept
+    open for the life of the process so its requests.Session reuses the
+    keep-alive connection.
+    """
+    key = (url, verify)
+    if key not in _sessions:
+        transport = RequestsHTTPTransport(
+            url=url,
+            verify=verify,
+            retries=3,
+            timeout=10,
+        )
+        client = Client(transport=transport)
+        _sessions[key] = client.connect_sync()
+    return _sessions[key]
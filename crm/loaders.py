@@ -0,0 +1,49 @@
+from crm.models import Customer, Order
+
+
+class CustomerLoader:
+    """
+    Loads customers by id, fetching each id at most once per request.
+
+    graphene-django resolves fields synchronously, so a load cannot be held
+    back and flushed with its siblings the way an async DataLoader does;
+    load_many() fetches every id that is not cached yet in one query.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def batch_load_fn(self, ids):
+        customers = Customer.objects.in_bulk(ids)
+        return [customers.get(i) for i in ids]
+
+    def load_many(self, ids):
+        missing = [i for i in dict.fromkeys(ids) if i not in self._cache]
+        if missing:
+            self._cache.update(zip(missing, self.batch_load_fn(missing)))
+        return [self._cache[i] for i in ids]
+
+    def load(self, id):
+        return self.load_many([id])[0]
+
+
+class Loaders:
+    """Loaders shared by every resolver of one GraphQL request."""
+
+    def __init__(self):
+        self.customer = CustomerLoader()
+
+    def prime_customers(self, orders):
+        """Load the customers of a page of orders in one query, skipping any already joined."""
+        ids = [o.customer_id for o in orders if isinstance(o, Order) and not Order.customer.is_cached(o)]
+        if ids:
+            self.customer.load_many(ids)
+
+
+class LoaderMiddleware:
+    """Graphene middleware that attaches a fresh Loaders to each request context."""
+
+    def resolve(self, next, root, info, **args):
+        if root is None and not hasattr(info.context, "loaders"):
+            info.context.loaders = Loaders()
+        return next(root, info, **args)
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# (index name, table, column) for every column the filters search with icontains
+TRIGRAM_INDEXES = [
+    ("crm_customer_name_trgm", "crm_customer", "name"),
+    ("crm_customer_email_trgm", "crm_customer", "email"),
+    ("crm_product_name_trgm", "crm_product", "name"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # icontains renders as UPPER(col::text) LIKE UPPER('%term%'), which only a
+    # pg_trgm GIN index on the same expression can serve; other backends scan.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
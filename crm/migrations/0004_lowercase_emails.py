@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-15 15:02
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    Customer = apps.get_model("crm", "Customer")
+    # Customers differing only in email case cannot both satisfy the new
+    # constraint, and picking one to rewrite or drop is not ours to decide.
+    clashes = list(
+        Customer.objects.values(email_lower=Lower("email"))
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("email_lower", flat=True)
+    )
+    if clashes:
+        raise RuntimeError(
+            "Customers share these emails up to case; merge or rename them before migrating: "
+            + ", ".join(sorted(clashes))
+        )
+    Customer.objects.exclude(email=Lower("email")).update(email=Lower("email"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='cust_email_upper_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='customer_email_lower_uniq'),
+        ),
+    ]
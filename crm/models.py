@@ -1,40 +1,78 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Lower
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
 class Customer(models.Model):
     name = models.CharField(max_length=255)
-    email = models.EmailField(unique=True)
-    phone = models.CharField(max_length=50, blank=True, null=True)  # store raw; validate in mutations
+    email = models.EmailField(unique=True)  # stored lowercased by the mutations
+    phone = models.CharField(max_length=50, blank=True, null=True, db_index=True)  # store raw; validate in mutations
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # Case-insensitive uniqueness for every writer, not just the mutations
+            models.UniqueConstraint(Lower("email"), name="customer_email_lower_uniq"),
+        ]
+
     def __str__(self):
         return f"{self.name} <{self.email}>"
 
+RESTOCK_BATCH_SIZE = 1000
+
+class ProductQuerySet(models.QuerySet):
+    def restock(self, amount, batch_size=RESTOCK_BATCH_SIZE):
+        """
+        Add ``amount`` to the stock of every product in the queryset and return the ids updated.
+        The UPDATE runs per batch of ids so its IN list stays bounded however many rows match.
+        """
+        updated = []
+        with transaction.atomic():
+            ids = list(self.values_list("id", flat=True))
+            now = timezone.now()
+            for start in range(0, len(ids), batch_size):
+                # Re-check the queryset's filter under a row lock, so a product an overlapping
+                # restock topped up since the ids were read is neither updated nor reported
+                batch = list(
+                    self.filter(id__in=ids[start:start + batch_size]).select_for_update().values_list("id", flat=True)
+                )
+                self.filter(id__in=batch).update(stock=F("stock") + amount, updated_at=now)
+                updated.extend(batch)
+        return updated
+
 class Product(models.Model):
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
-    stock = models.PositiveIntegerField(default=0)
+    stock = models.PositiveIntegerField(default=0, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} ({self.price})"
 
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders")
     products = models.ManyToManyField(Product, related_name="orders")
-    order_date = models.DateTimeField(auto_now_add=True)
+    order_date = models.DateTimeField(auto_now_add=True, db_index=True)
     total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["customer", "order_date"], name="order_customer_date_idx"),
+        ]
+
     def calculate_total(self):
-        total = sum([p.price for p in self.products.all()])
+        total = self.products.aggregate(total=Sum("price"))["total"] or Decimal("0")
         self.total_amount = total
         return total
 
@@ -1,43 +1,108 @@
 import re
 from decimal import Decimal
+from functools import lru_cache
 from graphene import relay
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.core.validators import validate_email
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Lower
 from django.utils import timezone
 import graphene
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from promise import Promise
 
 from crm.models import Product, Customer, Order
 from crm.filters import CustomerFilter, ProductFilter, OrderFilter
 
+# -----------------------------
+# Connection Fields
+# -----------------------------
+class PrefetchedConnectionField(DjangoFilterConnectionField):
+    """Filter connection that serves prefetched rows when no filter is applied."""
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args, filterset_class):
+        qs = maybe_queryset(iterable)
+        prefetched = getattr(qs, "_result_cache", None) is not None
+        if prefetched and all(args.get(arg) is None for arg in filtering_args):
+            return qs
+        return super().resolve_queryset(connection, iterable, info, args, filtering_args, filterset_class)
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager, queryset_resolver, max_limit,
+                            enforce_first_or_last, root, info, **args):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver, max_limit,
+            enforce_first_or_last, root, info, **args,
+        )
+        # Hand the whole page's customer ids to the loader before each node resolves its own
+        loaders = getattr(info.context, "loaders", None)
+        if (
+            loaders is not None
+            and not Promise.is_thenable(result)
+            and "customer" in selected_fields(info, "edges", "node")
+        ):
+            loaders.prime_customers(edge.node for edge in result.edges)
+        return result
+
+
+class CountableConnection(relay.Connection):
+    """Connection exposing the row count graphene-django already computes for paging."""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(required=True)
+
+    def resolve_total_count(self, info):
+        return self.length
+
+
 # -----------------------------
 # GraphQL Types
 # -----------------------------
 class CustomerType(DjangoObjectType):
+    orders = PrefetchedConnectionField(lambda: OrderType, required=True)
+
     class Meta:
         model = Customer
-        fields = "__all__"
+        connection_class = CountableConnection
+        fields = ("id", "name", "email", "phone", "created_at", "orders")
         interfaces = (relay.Node,)
         filterset_class = CustomerFilter
 
 
 class ProductType(DjangoObjectType):
+    orders = PrefetchedConnectionField(lambda: OrderType, required=True)
+
     class Meta:
         model = Product
-        fields = "__all__"
+        connection_class = CountableConnection
+        fields = ("id", "name", "price", "stock", "created_at", "orders")
         interfaces = (relay.Node,)
         filterset_class = ProductFilter
 
 
 class OrderType(DjangoObjectType):
+    products = PrefetchedConnectionField(ProductType, required=True)
+
     class Meta:
         model = Order
-        fields = "__all__"
+        connection_class = CountableConnection
+        fields = ("id", "customer", "products", "order_date", "total_amount", "created_at")
         interfaces = (relay.Node,)
         filterset_class = OrderFilter
 
+    def resolve_customer(self, info):
+        # Joined or prefetched customers are already on the instance
+        if Order.customer.is_cached(self) or not hasattr(info.context, "loaders"):
+            return self.customer
+        return info.context.loaders.customer.load(self.customer_id)
+
 
 # -----------------------------
 # Shared Error Type
@@ -48,7 +113,7 @@ class FieldError(graphene.ObjectType):
 
 
 # -----------------------------
-# Input for Bulk Creation
+# Inputs for Bulk Mutations
 # -----------------------------
 class CustomerInput(graphene.InputObjectType):
     name = graphene.String(required=True)
@@ -56,19 +121,119 @@ class CustomerInput(graphene.InputObjectType):
     phone = graphene.String()
 
 
+class StockUpdateInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    stock = graphene.Int(required=True)
+
+
 # -----------------------------
 # Validation Helpers
 # -----------------------------
+def _is_digits(value: str) -> bool:
+    # isdecimal() accepts exactly what the \d of a str pattern does: any Unicode decimal digit
+    return value.isdecimal()
+
+
 def validate_phone(phone: str) -> bool:
-    """Validate common phone number formats."""
+    """Validate common phone number formats: +1234567890, 123-456-7890 or 7-15 plain digits."""
     if not phone:
         return True
-    patterns = [
-        re.compile(r"^\+\d{7,15}$"),  # +1234567890
-        re.compile(r"^\d{3}-\d{3}-\d{4}$"),  # 123-456-7890
-        re.compile(r"^\d{7,15}$"),  # plain digits
-    ]
-    return any(p.match(phone) for p in patterns)
+    n = len(phone)
+    if phone[0] == "+":
+        return 8 <= n <= 16 and _is_digits(phone[1:])
+    if n == 12 and phone[3] == "-" and phone[7] == "-":
+        return _is_digits(phone[:3]) and _is_digits(phone[4:7]) and _is_digits(phone[8:])
+    return 7 <= n <= 15 and _is_digits(phone)
+
+
+def parse_product_id(value):
+    """Return ``value`` as a product primary key, or None if it cannot be one."""
+    try:
+        pk = int(value)
+    except (TypeError, ValueError):
+        return None
+    # Ids past the column's range would make the lookup itself fail
+    _, max_pk = connection.ops.integer_field_range(Product._meta.pk.get_internal_type())
+    return pk if 0 < pk <= max_pk else None
+
+
+# Every address Django's validator accepts has a local part and an "@" followed by
+# a domain without ASCII whitespace; its hostname class admits non-ASCII spaces
+# such as U+1680, hence re.ASCII
+_EMAIL_SHAPE_RE = re.compile(r"^.+@[^@\s]+\Z", re.DOTALL | re.ASCII)
+
+
+def is_valid_email(email: str) -> bool:
+    """Validate an email, rejecting obviously malformed ones before raising through the validator."""
+    if not _EMAIL_SHAPE_RE.match(email):
+        return False
+    try:
+        validate_email(email)
+    except ValidationError:
+        return False
+    return True
+
+
+@lru_cache(maxsize=1024)
+def validate_customer_fields(email: str, phone: str | None) -> tuple:
+    """
+    Return (field, message) pairs for every format problem in a customer's input.
+    Pure and cached, so retried or repeated inputs skip the validators.
+    """
+    problems = []
+    if not is_valid_email(email):
+        problems.append(("email", "Invalid email format."))
+    if phone and not validate_phone(phone):
+        problems.append(("phone", "Invalid phone format. Use +1234567890 or 123-456-7890."))
+    return tuple(problems)
+
+
+# Served by the customer_email_lower_uniq index, which also covers rows written
+# outside the mutations (admin, shell) in their original case
+_EMAIL_EXISTS_SQL = f"SELECT 1 FROM {Customer._meta.db_table} WHERE LOWER(email) = %s LIMIT 1"
+
+
+def email_exists(email: str) -> bool:
+    """Check for a customer with this (lowercased) email, in any case, without compiling an ORM query."""
+    with connection.cursor() as cursor:
+        cursor.execute(_EMAIL_EXISTS_SQL, [email])
+        return cursor.fetchone() is not None
+
+
+# -----------------------------
+# Selection Helpers
+# -----------------------------
+def _field_selections(selection_set, fragments):
+    """Yield the field nodes of a selection set, expanding fragments."""
+    for selection in selection_set.selections if selection_set else ():
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _field_selections(fragment.selection_set, fragments)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _field_selections(selection.selection_set, fragments)
+
+
+def selected_fields(info, *path):
+    """
+    Return the names of the fields the query selects on the field being resolved,
+    or below it when a path of field names such as ("edges", "node") is given.
+    """
+    nodes = list(info.field_nodes)
+    for name in path:
+        nodes = [
+            child
+            for node in nodes
+            for child in _field_selections(node.selection_set, info.fragments)
+            if child.name.value == name
+        ]
+    return {
+        child.name.value
+        for node in nodes
+        for child in _field_selections(node.selection_set, info.fragments)
+    }
 
 
 # -----------------------------
@@ -88,26 +253,19 @@ class CreateCustomer(graphene.Mutation):
 
     @classmethod
     def mutate(cls, root, info, name, email, phone=None):
-        errors = []
+        # Emails are stored lowercased; uniqueness is case-insensitive in the database
+        email = email.strip().lower()
 
-        # Validate email format
-        try:
-            validate_email(email)
-        except ValidationError:
-            errors.append(FieldError(field="email", message="Invalid email format."))
+        errors = [FieldError(field=field, message=message) for field, message in validate_customer_fields(email, phone)]
 
         # Check unique email
-        if Customer.objects.filter(email__iexact=email).exists():
+        if email_exists(email):
             errors.append(FieldError(field="email", message="Email already exists."))
 
-        # Validate phone format
-        if phone and not validate_phone(phone):
-            errors.append(FieldError(field="phone", message="Invalid phone format. Use +1234567890 or 123-456-7890."))
-
         if errors:
             return CreateCustomer(success=False, message="Validation errors", errors=errors)
 
-        customer = Customer.objects.create(name=name.strip(), email=email.strip(), phone=phone)
+        customer = Customer.objects.create(name=name.strip(), email=email, phone=phone)
         return CreateCustomer(customer=customer, success=True, message="Customer created successfully", errors=[])
 
 
@@ -123,30 +281,48 @@ class BulkCreateCustomers(graphene.Mutation):
 
     @classmethod
     def mutate(cls, root, info, customers):
-        created, errors = [], []
+        created, errors, pending = [], [], []
+
+        # One query for every incoming email that is already taken
+        incoming = [c.email.strip().lower() for c in customers]
+        existing = set(
+            Customer.objects.annotate(email_lower=Lower("email"))
+            .filter(email_lower__in=incoming)
+            .values_list("email_lower", flat=True)
+        )
 
         for index, c in enumerate(customers):
-            name, email, phone = c.name.strip(), c.email.strip(), c.phone
-            try:
-                validate_email(email)
-            except ValidationError:
-                errors.append(FieldError(field=f"customers[{index}].email", message="Invalid email format."))
+            name, email, phone = c.name.strip(), c.email.strip().lower(), c.phone
+            # One error per rejected input, so the failure count matches the rows
+            problems = validate_customer_fields(email, phone)
+            if problems:
+                field, message = problems[0]
+                errors.append(FieldError(field=f"customers[{index}].{field}", message=message))
                 continue
 
-            if Customer.objects.filter(email__iexact=email).exists():
+            if email in existing:
                 errors.append(FieldError(field=f"customers[{index}].email", message="Email already exists."))
                 continue
 
-            if phone and not validate_phone(phone):
-                errors.append(FieldError(field=f"customers[{index}].phone", message="Invalid phone format."))
-                continue
+            # Later duplicates within the same batch are rejected like stored ones
+            existing.add(email)
+            pending.append((index, Customer(name=name, email=email, phone=phone)))
 
+        if pending:
             try:
                 with transaction.atomic():
-                    cust = Customer.objects.create(name=name, email=email, phone=phone)
-                    created.append(cust)
-            except Exception as e:
-                errors.append(FieldError(field=f"customers[{index}]", message=f"Error: {str(e)}"))
+                    created = Customer.objects.bulk_create([cust for _, cust in pending], batch_size=500)
+            except Exception:
+                # The batch was rolled back; insert row by row so only the offending inputs fail
+                created = []
+                for index, cust in pending:
+                    cust.pk = None  # drop any id assigned by the rolled-back batch
+                    try:
+                        with transaction.atomic():
+                            cust.save(force_insert=True)
+                        created.append(cust)
+                    except Exception as e:
+                        errors.append(FieldError(field=f"customers[{index}]", message=f"Error: {str(e)}"))
 
         success = len(errors) == 0
         msg = (
@@ -157,6 +333,12 @@ class BulkCreateCustomers(graphene.Mutation):
         return BulkCreateCustomers(created_customers=created, errors=errors, success=success, message=msg)
 
 
+# Prices must fit Product.price: below 10 ** (max_digits - decimal_places), in whole cents
+_PRICE_FIELD = Product._meta.get_field("price")
+PRICE_LIMIT = Decimal(10) ** (_PRICE_FIELD.max_digits - _PRICE_FIELD.decimal_places)
+PRICE_QUANTUM = Decimal(1).scaleb(-_PRICE_FIELD.decimal_places)
+
+
 class CreateProduct(graphene.Mutation):
     """Create a product."""
     class Arguments:
@@ -172,12 +354,20 @@ class CreateProduct(graphene.Mutation):
     @classmethod
     def mutate(cls, root, info, name, price, stock=0):
         errors = []
+        # str() gives the shortest repr (0.1, not 0.1000000000000000055511...)
+        price = Decimal(str(price))
+        # Only in-range values are rounded; quantize() raises once the result
+        # outgrows the decimal context's precision
+        if abs(price) < PRICE_LIMIT:
+            price = price.quantize(PRICE_QUANTUM)
 
         if not name.strip():
             errors.append(FieldError(field="name", message="Name cannot be empty."))
 
         if price <= 0:
             errors.append(FieldError(field="price", message="Price must be positive."))
+        elif price >= PRICE_LIMIT:
+            errors.append(FieldError(field="price", message=f"Price must be below {PRICE_LIMIT:,}."))
 
         if stock < 0:
             errors.append(FieldError(field="stock", message="Stock cannot be negative."))
@@ -185,7 +375,7 @@ class CreateProduct(graphene.Mutation):
         if errors:
             return CreateProduct(success=False, message="Validation errors", errors=errors)
 
-        product = Product.objects.create(name=name.strip(), price=Decimal(price), stock=stock)
+        product = Product.objects.create(name=name.strip(), price=price, stock=stock)
         return CreateProduct(product=product, success=True, message="Product created successfully", errors=[])
 
 
@@ -213,9 +403,19 @@ class CreateOrder(graphene.Mutation):
         if not product_ids:
             errors.append(FieldError(field="product_ids", message="At least one product is required."))
         else:
-            valid_products = list(Product.objects.filter(id__in=product_ids))
-            if len(valid_products) != len(product_ids):
-                invalid_ids = set(product_ids) - set(p.id for p in valid_products)
+            requested_ids, unparseable = set(), []
+            for raw_id in product_ids:
+                pid = parse_product_id(raw_id)
+                if pid is None:
+                    unparseable.append(raw_id)
+                else:
+                    requested_ids.add(pid)
+
+            # Count and price the products in one query instead of loading them
+            totals = Product.objects.filter(id__in=requested_ids).aggregate(total=Sum("price"), found=Count("id"))
+            if unparseable or totals["found"] != len(requested_ids):
+                valid_ids = Product.objects.filter(id__in=requested_ids).values_list("id", flat=True)
+                invalid_ids = [*unparseable, *sorted(requested_ids.difference(valid_ids))]
                 errors.append(FieldError(field="product_ids", message=f"Invalid IDs: {', '.join(map(str, invalid_ids))}"))
 
         if errors:
@@ -225,31 +425,88 @@ class CreateOrder(graphene.Mutation):
             order = Order.objects.create(
                 customer=customer,
                 order_date=order_date or timezone.now(),
-                total_amount=Decimal("0.00"),
+                total_amount=totals["total"],
             )
-            order.products.set(valid_products)
-            total_amount = sum(p.price for p in valid_products)
-            order.total_amount = total_amount
-            order.save()
+            order.products.add(*requested_ids)
 
         return CreateOrder(order=order, success=True, message="Order created successfully", errors=[])
 
 
+# Most products echoed back by updateLowStockProducts; updatedCount carries the full total
+UPDATED_PRODUCTS_SAMPLE_SIZE = 100
+
+
 class UpdateLowStockProducts(graphene.Mutation):
     """Restock low-stock products (< 10 by default)."""
     class Arguments:
         threshold = graphene.Int(required=False, default_value=10)
         restock_amount = graphene.Int(required=False, default_value=50)
 
+    updated_products = graphene.List(ProductType)
     updated_count = graphene.Int()
+    success = graphene.Boolean()
+    message = graphene.String()
 
     def mutate(self, info, threshold, restock_amount):
-        low_stock_products = Product.objects.filter(stock__lt=threshold)
-        updated_count = low_stock_products.count()
-        for p in low_stock_products:
-            p.stock += restock_amount
-            p.save()
-        return UpdateLowStockProducts(updated_count=updated_count)
+        low_stock = Product.objects.filter(stock__lt=threshold)
+        updated_products = None
+
+        if "updatedProducts" in selected_fields(info):
+            ids = low_stock.restock(restock_amount)
+            updated_count = len(ids)
+            updated_products = Product.objects.filter(id__in=ids[:UPDATED_PRODUCTS_SAMPLE_SIZE])
+        else:
+            # Nobody reads the rows back, so one UPDATE can report the count itself
+            updated_count = low_stock.update(stock=F("stock") + restock_amount, updated_at=timezone.now())
+
+        return UpdateLowStockProducts(
+            updated_products=updated_products,
+            updated_count=updated_count,
+            success=True,
+            message=f"Restocked {updated_count} low-stock products.",
+        )
+
+
+class BulkUpdateStock(graphene.Mutation):
+    """Set stock levels for many products in one write (partial success allowed)."""
+    class Arguments:
+        items = graphene.List(graphene.NonNull(StockUpdateInput), required=True)
+
+    updated_products = graphene.List(ProductType)
+    errors = graphene.List(FieldError)
+    success = graphene.Boolean()
+    message = graphene.String()
+
+    @classmethod
+    def mutate(cls, root, info, items):
+        errors = []
+        pids = [parse_product_id(item.product_id) for item in items]
+        products = Product.objects.in_bulk({pid for pid in pids if pid is not None})
+
+        now = timezone.now()
+        to_update = {}
+        for index, (item, pid) in enumerate(zip(items, pids)):
+            if item.stock < 0:
+                errors.append(FieldError(field=f"items[{index}].stock", message="Stock cannot be negative."))
+                continue
+            product = products.get(pid)
+            if product is None:
+                errors.append(FieldError(field=f"items[{index}].product_id", message="Invalid product ID."))
+                continue
+            product.stock = item.stock
+            product.updated_at = now
+            to_update[pid] = product
+
+        updated = list(to_update.values())
+        Product.objects.bulk_update(updated, ["stock", "updated_at"], batch_size=500)
+
+        success = len(errors) == 0
+        msg = (
+            "All products updated successfully."
+            if success
+            else f"Updated {len(updated)} products; {len(errors)} failed."
+        )
+        return BulkUpdateStock(updated_products=updated, errors=errors, success=success, message=msg)
 
 
 # -----------------------------
@@ -260,19 +517,46 @@ class Query(graphene.ObjectType):
     all_customers = DjangoFilterConnectionField(CustomerType, order_by=graphene.String())
     all_products = DjangoFilterConnectionField(ProductType, order_by=graphene.String())
     all_orders = DjangoFilterConnectionField(OrderType, order_by=graphene.String())
+    total_revenue = graphene.Decimal(required=True)
+    # Plain COUNT(*) scalars for summaries that do not need a connection's row page
+    customer_count = graphene.Int(required=True)
+    order_count = graphene.Int(required=True)
+
+    # Relations are joined or prefetched only when the query selects them on the nodes
 
     def resolve_all_customers(self, info, order_by=None, **kwargs):
-        qs = Customer.objects.all()
+        qs = Customer.objects.defer("updated_at")
+        if "orders" in selected_fields(info, "edges", "node"):
+            qs = qs.prefetch_related("orders")
         return qs.order_by(order_by) if order_by else qs
 
     def resolve_all_products(self, info, order_by=None, **kwargs):
-        qs = Product.objects.all()
+        qs = Product.objects.defer("updated_at")
+        if "orders" in selected_fields(info, "edges", "node"):
+            if "customer" in selected_fields(info, "edges", "node", "orders", "edges", "node"):
+                qs = qs.prefetch_related("orders__customer")
+            else:
+                qs = qs.prefetch_related("orders")
         return qs.order_by(order_by) if order_by else qs
 
     def resolve_all_orders(self, info, order_by=None, **kwargs):
-        qs = Order.objects.all()
+        qs = Order.objects.defer("updated_at")
+        node_fields = selected_fields(info, "edges", "node")
+        if "customer" in node_fields:
+            qs = qs.select_related("customer").defer("customer__updated_at")
+        if "products" in node_fields:
+            qs = qs.prefetch_related("products")
         return qs.order_by(order_by) if order_by else qs
 
+    def resolve_total_revenue(self, info):
+        return Order.objects.aggregate(total=Sum("total_amount"))["total"] or Decimal("0")
+
+    def resolve_customer_count(self, info):
+        return Customer.objects.count()
+
+    def resolve_order_count(self, info):
+        return Order.objects.count()
+
 
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
@@ -280,6 +564,7 @@ class Mutation(graphene.ObjectType):
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
+    bulk_update_stock = BulkUpdateStock.Field()
 
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
@@ -44,14 +44,14 @@ INSTALLED_APPS = [
 
     # your crm app
     'crm',
-    'django_crontab',
     'django_celery_beat',
 
 ]
 
 # pointing graphene to where the schema is:
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql.schema.schema"
+    "SCHEMA": "alx_backend_graphql.schema.schema",
+    "MIDDLEWARE": ["crm.loaders.LoaderMiddleware"],
 }
 
 MIDDLEWARE = [
@@ -91,6 +91,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open across requests instead of reconnecting each time
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -136,18 +139,14 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CRONJOBS = [
-    ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
-    ('0 */12 * * *', 'crm.cron.update_low_stock'),
-]
-
-
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_TIMEZONE = 'Africa/Nairobi'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 min
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # long tasks must not hold queued siblings
 
 # Celery Beat Schedule
 CELERY_BEAT_SCHEDULE = {
@@ -155,4 +154,12 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'crm.tasks.generate_crm_report',
         'schedule': crontab(day_of_week='mon', hour=6, minute=0),
     },
+    'log-crm-heartbeat': {
+        'task': 'crm.tasks.log_crm_heartbeat',
+        'schedule': crontab(minute='*/5'),
+    },
+    'update-low-stock': {
+        'task': 'crm.tasks.update_low_stock',
+        'schedule': crontab(minute=0, hour='*/12'),
+    },
 }
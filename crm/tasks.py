@@ -1,14 +1,23 @@
 import os
+import time
 import logging
 import requests
 from datetime import datetime
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+from decimal import Decimal
+from gql import gql
 from celery import shared_task
 
+from crm import cron
+from crm.gql_client import get_gql_session
+from crm.models import Product, RESTOCK_BATCH_SIZE
+
 # GraphQL endpoint for internal queries
 GRAPHQL_ENDPOINT = "http://localhost:8000/graphql/"
 
+# Same defaults as the updateLowStockProducts mutation
+LOW_STOCK_THRESHOLD = 10
+RESTOCK_AMOUNT = 50
+
 LOG_FILE = "/tmp/crm_report_log.txt"
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
@@ -17,8 +26,18 @@ logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(message)s",
 )
+logger = logging.getLogger("crm.report")
 
 
+# Only server-side aggregates; no customer or order rows cross the wire
+CRM_REPORT_QUERY = gql("""
+{
+    customerCount
+    orderCount
+    totalRevenue
+}
+""")
+
 @shared_task
 def generate_crm_report():
     """
@@ -26,46 +45,49 @@ def generate_crm_report():
     Runs weekly (Monday 6:00 AM via Celery Beat).
     """
     try:
-        # GraphQL client setup
-        transport = RequestsHTTPTransport(url=GRAPHQL_ENDPOINT, verify=False)
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
-        query = gql("""
-        {
-            allCustomers {
-                totalCount
-            }
-            allOrders {
-                totalCount
-                edges {
-                    node {
-                        totalAmount
-                    }
-                }
-            }
-        }
-        """)
-
-        result = client.execute(query)
-
-        total_customers = result["allCustomers"]["totalCount"]
-        total_orders = result["allOrders"]["totalCount"]
-        total_revenue = sum(
-            float(order["node"]["totalAmount"]) for order in result["allOrders"]["edges"]
-        )
+        result = get_gql_session(GRAPHQL_ENDPOINT, verify=False).execute(CRM_REPORT_QUERY)
 
-        report_message = (
-            f"Report: {total_customers} customers, "
-            f"{total_orders} orders, "
-            f"{total_revenue:.2f} revenue."
-        )
+        total_customers = result["customerCount"]
+        total_orders = result["orderCount"]
+        # Decimal scalars arrive as strings; keep them exact
+        total_revenue = Decimal(result["totalRevenue"]).quantize(Decimal("0.01"))
 
-        logging.info(report_message)
+        # %s rather than %.2f: the latter would round-trip the Decimal through float
+        logger.info(
+            "Report: %s customers, %s orders, %s revenue.",
+            total_customers, total_orders, total_revenue,
+        )
 
-        print(f"[CRM Report Generated] {report_message}")
+        print(f"[CRM Report Generated] Report: {total_customers} customers, {total_orders} orders, {total_revenue} revenue.")
 
     except Exception as e:
-        logging.error(f"Error generating CRM report: {e}")
+        logger.exception("Error generating CRM report")
         print(f"Error generating CRM report: {e}")
 
 # Schedule this task in Celery Beat to run every Monday at 6:00 AM
+
+
+@shared_task
+def log_crm_heartbeat():
+    """
+    Logs the CRM heartbeat to /tmp/crm_heartbeat_log.txt.
+    Runs every 5 minutes via Celery Beat.
+    """
+    cron.log_crm_heartbeat()
+
+
+@shared_task
+def update_low_stock():
+    """
+    Restocks low-stock products directly through the ORM and logs the new
+    stock levels to /tmp/low_stock_updates_log.txt.
+    Runs every 12 hours via Celery Beat.
+    """
+    timestamp = time.strftime("%d/%m/%Y-%H:%M:%S")
+    ids = Product.objects.filter(stock__lt=LOW_STOCK_THRESHOLD).restock(RESTOCK_AMOUNT)
+    products = (
+        row
+        for start in range(0, len(ids), RESTOCK_BATCH_SIZE)
+        for row in Product.objects.filter(id__in=ids[start:start + RESTOCK_BATCH_SIZE]).values_list("name", "stock")
+    )
+    cron.log_low_stock_update(timestamp, f"Restocked {len(ids)} low-stock products.", products)
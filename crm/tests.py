@@ -1,3 +1,397 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from alx_backend_graphql.schema import schema
+from crm.loaders import LoaderMiddleware, Loaders
+from crm.models import Customer, Order, Product
+from crm.schema import is_valid_email, validate_phone
+
+
+def execute(query, **kwargs):
+    """Run a query the way GraphQLView does: fresh request context and the loader middleware."""
+    return schema.execute(
+        query,
+        context_value=RequestFactory().post("/graphql/"),
+        middleware=[LoaderMiddleware()],
+        **kwargs,
+    )
+
+
+class CRMTestCase(TestCase):
+    """Three products shared by orders from four customers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f"Product {i}", price=i + 1, stock=i) for i in range(3)
+        ]
+        cls.customers = [
+            Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(4)
+        ]
+        for customer in cls.customers:
+            for product in cls.products[:2]:
+                order = Order.objects.create(customer=customer, total_amount=product.price)
+                order.products.add(product)
+
+    def assertNoErrors(self, result):
+        self.assertIsNone(result.errors, result.errors)
+
+
+class CustomerLoaderTests(CRMTestCase):
+    def test_unfiltered_nested_orders_join_customers_in_the_prefetch(self):
+        # count, products, orders, customers
+        with self.assertNumQueries(4):
+            result = execute("{ allProducts { edges { node { orders { edges { node { customer { name } } } } } } } }")
+        self.assertNoErrors(result)
+
+    def test_filtered_nested_orders_load_customers_once_per_request(self):
+        # count, products and the prefetches the filter discards; per product with orders a
+        # count and a page, the product without orders only a count; then a single IN query
+        # for the first page's customers, which every later page finds cached
+        with self.assertNumQueries(4 + 2 * 2 + 1 + 1):
+            result = execute(
+                "{ allProducts { edges { node { orders(totalAmount_Gte: 0) { edges { node { customer { name } } } } } } } }"
+            )
+        self.assertNoErrors(result)
+        names = {
+            order["node"]["customer"]["name"]
+            for product in result.data["allProducts"]["edges"]
+            for order in product["node"]["orders"]["edges"]
+        }
+        self.assertEqual(names, {c.name for c in self.customers})
+
+
+class CustomerLoaderBatchTests(CRMTestCase):
+    def test_load_many_fetches_the_batch_keys_in_one_query(self):
+        loader = Loaders().customer
+        ids = [c.id for c in self.customers] + [self.customers[0].id, 0]
+        with self.assertNumQueries(1):
+            loaded = loader.load_many(ids)
+        self.assertEqual(loaded, self.customers + [self.customers[0], None])
+
+    def test_primed_orders_resolve_without_queries(self):
+        loaders = Loaders()
+        orders = list(Order.objects.all())
+        with self.assertNumQueries(1):
+            loaders.prime_customers(orders)
+        with self.assertNumQueries(0):
+            customers = [loaders.customer.load(o.customer_id) for o in orders]
+        self.assertEqual([c.id for c in customers], [o.customer_id for o in orders])
+
+
+class CustomerEmailUniquenessTests(TestCase):
+    def setUp(self):
+        # Written outside the mutations, so stored in its original case
+        Customer.objects.create(name="Mixed", email="Mixed@Case.com")
+
+    def test_create_customer_rejects_email_differing_only_in_case(self):
+        result = execute('mutation { createCustomer(name: "x", email: "mixed@case.COM") { success errors { field message } } }')
+        self.assertEqual(
+            result.data["createCustomer"],
+            {"success": False, "errors": [{"field": "email", "message": "Email already exists."}]},
+        )
+
+    def test_bulk_create_rejects_email_differing_only_in_case(self):
+        result = execute(
+            'mutation { bulkCreateCustomers(customers: [{name: "a", email: "MIXED@case.com"}, {name: "b", email: "New@Case.com"}])'
+            " { errors { field message } createdCustomers { email } } }"
+        )
+        data = result.data["bulkCreateCustomers"]
+        self.assertEqual(data["errors"], [{"field": "customers[0].email", "message": "Email already exists."}])
+        self.assertEqual(data["createdCustomers"], [{"email": "new@case.com"}])
+
+    def test_database_rejects_email_differing_only_in_case(self):
+        with self.assertRaises(IntegrityError):
+            Customer.objects.create(name="Other", email="MIXED@case.com")
+
+
+class LowercaseEmailsMigrationTests(TransactionTestCase):
+    migrate_from = [("crm", "0003_trigram_indexes")]
+    migrate_to = [("crm", "0004_lowercase_emails")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.old_customer = executor.loader.project_state(self.migrate_from).apps.get_model("crm", "Customer")
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        return executor.loader.project_state(self.migrate_to).apps.get_model("crm", "Customer")
+
+    def test_lowercases_stored_emails(self):
+        self.old_customer.objects.create(name="a", email="Upper@Example.com")
+        self.old_customer.objects.create(name="b", email="lower@example.com")
+        Customer = self.migrate()
+        self.assertEqual(
+            sorted(Customer.objects.values_list("email", flat=True)),
+            ["lower@example.com", "upper@example.com"],
+        )
+
+    def test_refuses_emails_that_clash_up_to_case(self):
+        self.old_customer.objects.create(name="a", email="Same@Example.com")
+        self.old_customer.objects.create(name="b", email="same@example.com")
+        with self.assertRaisesMessage(RuntimeError, "same@example.com"):
+            self.migrate()
+        # Let tearDown migrate forward again
+        self.old_customer.objects.all().delete()
+
+
+class BulkUpdateStockTests(CRMTestCase):
+    def test_reports_bad_items_and_updates_the_rest(self):
+        first, second = self.products[0], self.products[1]
+        result = execute(
+            "mutation { bulkUpdateStock(items: ["
+            f'{{productId: "0{first.id}", stock: 7}}, '
+            '{productId: "abc", stock: 1}, '
+            '{productId: "0", stock: 1}, '
+            f'{{productId: "{second.id}", stock: -1}}, '
+            '{productId: "99999999999999999999999", stock: 1}'
+            "]) { success errors { field message } updatedProducts { name stock } } }"
+        )
+        self.assertNoErrors(result)
+        data = result.data["bulkUpdateStock"]
+        self.assertFalse(data["success"])
+        self.assertEqual(data["errors"], [
+            {"field": "items[1].product_id", "message": "Invalid product ID."},
+            {"field": "items[2].product_id", "message": "Invalid product ID."},
+            {"field": "items[3].stock", "message": "Stock cannot be negative."},
+            {"field": "items[4].product_id", "message": "Invalid product ID."},
+        ])
+        self.assertEqual(data["updatedProducts"], [{"name": first.name, "stock": 7}])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, second.stock), (7, 1))
+
+
+class RestockTests(CRMTestCase):
+    def test_restock_skips_rows_topped_up_after_the_ids_were_read(self):
+        first, second = self.products[0], self.products[1]
+        real_now = timezone.now
+
+        def concurrent_restock():
+            # Runs between the id read and the UPDATE, like an overlapping restock would
+            Product.objects.filter(id=first.id).update(stock=50)
+            return real_now()
+
+        with mock.patch("crm.models.timezone.now", side_effect=concurrent_restock):
+            ids = Product.objects.filter(stock__lt=2).restock(50)
+
+        self.assertEqual(ids, [second.id])
+        self.assertEqual(
+            list(Product.objects.order_by("id").values_list("stock", flat=True)),
+            [50, 51, 2],
+        )
+
+
+class CreateProductTests(TestCase):
+    def create(self, price):
+        result = execute(
+            f'mutation {{ createProduct(name: "Lamp", price: {price}) {{ success errors {{ field message }} product {{ price }} }} }}'
+        )
+        self.assertIsNone(result.errors, result.errors)
+        return result.data["createProduct"]
+
+    def test_price_is_converted_through_its_shortest_repr(self):
+        self.assertEqual(self.create("0.1")["product"], {"price": "0.10"})
+        self.assertEqual(self.create("19.999")["product"], {"price": "20.00"})
+
+    def test_price_rounding_to_zero_is_rejected(self):
+        self.assertEqual(self.create("0.004")["errors"], [{"field": "price", "message": "Price must be positive."}])
+
+    def test_price_beyond_the_column_is_rejected(self):
+        too_large = [{"field": "price", "message": "Price must be below 10,000,000,000."}]
+        self.assertEqual(self.create("9999999999.995")["errors"], too_large)
+        self.assertEqual(self.create("1e30")["errors"], too_large)
+        self.assertEqual(self.create("-1e30")["errors"], [{"field": "price", "message": "Price must be positive."}])
+        self.assertFalse(Product.objects.exists())
+
+
+class SummaryFieldTests(CRMTestCase):
+    def test_report_summary_is_three_aggregate_queries(self):
+        with self.assertNumQueries(3):
+            result = execute("{ customerCount orderCount totalRevenue }")
+        self.assertNoErrors(result)
+        self.assertEqual(result.data, {"customerCount": 4, "orderCount": 8, "totalRevenue": "12"})
+
+
+class ValidatePhoneTests(TestCase):
+    def test_accepted_formats(self):
+        for phone in ["", None, "+1234567", "+123456789012345", "123-456-7890", "1234567", "123456789012345", "\u0663937360640"]:
+            with self.subTest(phone=phone):
+                self.assertTrue(validate_phone(phone))
+
+    def test_rejected_formats(self):
+        for phone in ["+123456", "+1234567890123456", "123456", "1234567890123456", "12-3456-7890", "123-456-789x", "\u00b2234567", "1234567\n"]:
+            with self.subTest(phone=phone):
+                self.assertFalse(validate_phone(phone))
+
+
+class IsValidEmailTests(TestCase):
+    def test_shape_check_agrees_with_djangos_validator_on_whitespace(self):
+        for char in [chr(cp) for cp in range(0x3001) if chr(cp).isspace()]:
+            for email in [f"a@ex{char}ample.com", f"a{char}b@example.com"]:
+                with self.subTest(email=email):
+                    try:
+                        validate_email(email)
+                    except ValidationError:
+                        expected = False
+                    else:
+                        expected = True
+                    self.assertEqual(is_valid_email(email), expected)
+
+    def test_non_ascii_space_in_domain_is_accepted(self):
+        self.assertTrue(is_valid_email("a@ex ample.com"))
+
+
+class ConnectionQueryCountTests(CRMTestCase):
+    def test_nodes_without_relations_skip_joins_and_prefetches(self):
+        # count and page
+        with self.assertNumQueries(2):
+            result = execute("{ allOrders { edges { node { totalAmount } } } }")
+        self.assertNoErrors(result)
+
+    def test_selected_relations_are_joined_and_prefetched(self):
+        # count, page joined with customers, products
+        with self.assertNumQueries(3):
+            result = execute(
+                "{ allOrders { edges { node { customer { name } products { edges { node { name } } } } } } }"
+            )
+        self.assertNoErrors(result)
+        self.assertEqual(len(result.data["allOrders"]["edges"]), 8)
+
+    def test_relations_selected_through_fragments_are_prefetched(self):
+        query = """
+            { allOrders { edges { ...OrderEdge } } }
+            fragment OrderEdge on OrderTypeEdge {
+                node { ... on OrderType { customer { email } products { edges { node { name } } } } }
+            }
+        """
+        with self.assertNumQueries(3):
+            result = execute(query)
+        self.assertNoErrors(result)
+
+    def test_unfiltered_nested_connection_uses_the_prefetch(self):
+        # count, customers, orders
+        with self.assertNumQueries(3):
+            result = execute("{ allCustomers { edges { node { orders { totalCount edges { node { id } } } } } } }")
+        self.assertNoErrors(result)
+        self.assertEqual(
+            [c["node"]["orders"]["totalCount"] for c in result.data["allCustomers"]["edges"]],
+            [2, 2, 2, 2],
+        )
+
+    def test_filtered_nested_connection_queries_per_parent_and_applies_the_filter(self):
+        # count, customers, the discarded prefetch, then a count and a page per customer
+        with self.assertNumQueries(3 + 2 * len(self.customers)):
+            result = execute(
+                "{ allCustomers { edges { node { orders(totalAmount_Gte: 2) { edges { node { totalAmount } } } } } } }"
+            )
+        self.assertNoErrors(result)
+        for customer in result.data["allCustomers"]["edges"]:
+            self.assertEqual(
+                [o["node"]["totalAmount"] for o in customer["node"]["orders"]["edges"]],
+                ["2.00"],
+            )
+
+
+class UpdateLowStockProductsTests(CRMTestCase):
+    def test_count_only_restock_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            result = execute("mutation { updateLowStockProducts(threshold: 2) { updatedCount message } }")
+        self.assertNoErrors(result)
+        self.assertEqual(result.data["updateLowStockProducts"]["updatedCount"], 2)
+        self.assertEqual(
+            list(Product.objects.order_by("id").values_list("stock", flat=True)),
+            [50, 51, 2],
+        )
+
+    def test_selected_updated_products_are_returned(self):
+        result = execute(
+            "mutation { updateLowStockProducts(threshold: 2) { updatedCount updatedProducts { name stock } } }"
+        )
+        self.assertNoErrors(result)
+        data = result.data["updateLowStockProducts"]
+        self.assertEqual(data["updatedCount"], 2)
+        self.assertEqual(
+            sorted((p["name"], p["stock"]) for p in data["updatedProducts"]),
+            [("Product 0", 50), ("Product 1", 51)],
+        )
+
+
+class CreateOrderTests(CRMTestCase):
+    def test_reports_only_the_missing_product_ids(self):
+        product = self.products[0]
+        result = execute(
+            f'mutation {{ createOrder(customerId: "{self.customers[0].id}", '
+            f'productIds: ["{product.id}", "0{product.id}", "999", "998"]) {{ success errors {{ field message }} }} }}'
+        )
+        self.assertNoErrors(result)
+        self.assertEqual(
+            result.data["createOrder"],
+            {"success": False, "errors": [{"field": "product_ids", "message": "Invalid IDs: 998, 999"}]},
+        )
+
+    def test_reports_unparseable_and_out_of_range_product_ids(self):
+        product = self.products[0]
+        result = execute(
+            f'mutation {{ createOrder(customerId: "{self.customers[0].id}", '
+            f'productIds: ["{product.id}", null, "abc", "1.0", "99999999999999999999999", "999"]) '
+            "{ success errors { field message } } }"
+        )
+        self.assertNoErrors(result)
+        self.assertEqual(
+            result.data["createOrder"],
+            {"success": False, "errors": [
+                {"field": "product_ids", "message": "Invalid IDs: None, abc, 1.0, 99999999999999999999999, 999"},
+            ]},
+        )
+        self.assertEqual(Order.objects.count(), 8)
+
+    def test_duplicate_product_ids_count_once(self):
+        product = self.products[1]
+        result = execute(
+            f'mutation {{ createOrder(customerId: "{self.customers[0].id}", productIds: ["{product.id}", "0{product.id}"]) '
+            "{ success order { totalAmount products { totalCount } } } }"
+        )
+        self.assertNoErrors(result)
+        self.assertEqual(
+            result.data["createOrder"],
+            {"success": True, "order": {"totalAmount": "2", "products": {"totalCount": 1}}},
+        )
+
+
+class BulkCreateCustomersTests(TestCase):
+    def test_failed_batch_falls_back_to_row_inserts(self):
+        real_save = Customer.save
+
+        def save(customer, *args, **kwargs):
+            # As if another writer had taken this email after the existence check
+            if customer.email == "taken@example.com":
+                raise IntegrityError("UNIQUE constraint failed: crm_customer.email")
+            return real_save(customer, *args, **kwargs)
+
+        with mock.patch.object(type(Customer.objects), "bulk_create", side_effect=IntegrityError("batch failed")), \
+                mock.patch.object(Customer, "save", autospec=True, side_effect=save):
+            result = execute(
+                'mutation { bulkCreateCustomers(customers: [{name: "a", email: "a@example.com"}, '
+                '{name: "b", email: "taken@example.com"}, {name: "c", email: "c@example.com"}]) '
+                "{ success message errors { field } createdCustomers { email } } }"
+            )
+
+        self.assertIsNone(result.errors, result.errors)
+        data = result.data["bulkCreateCustomers"]
+        self.assertEqual(data["errors"], [{"field": "customers[1]"}])
+        self.assertEqual(data["createdCustomers"], [{"email": "a@example.com"}, {"email": "c@example.com"}])
+        self.assertEqual(data["message"], "Created 2 customers; 1 failed.")
+        self.assertEqual(Customer.objects.count(), 2)